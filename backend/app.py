@@ -5,25 +5,42 @@ A Flask backend that accepts airway images and returns difficulty assessments
 using a trained ConvNeXt-based model.
 """
 
+import hashlib
+import io
 import os
-from flask import Flask, request, jsonify
+import threading
+from collections import OrderedDict
+from contextlib import ExitStack
+
+from flask import Flask, Request, request, jsonify
 from flask_cors import CORS
-from PIL import Image
+from PIL import Image, JpegImagePlugin
+
+
+class InMemoryRequest(Request):
+    """Request that keeps file uploads in memory instead of spooling them to disk."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return io.BytesIO()
+
 
 app = Flask(__name__)
+app.request_class = InMemoryRequest
+# Uploads are held in RAM, so cap the total request size
+app.config["MAX_CONTENT_LENGTH"] = 64 * 1024 * 1024
 CORS(app)
 
 # Try to import model - will fail gracefully if dependencies missing
 MODEL_AVAILABLE = False
 try:
-    from model import predict_difficulty, get_model, MODEL_PATH
+    from model import predict_difficulty, preload_model, MODEL_PATH, ONNX_PATH, USE_ORT
     MODEL_AVAILABLE = True
 except ImportError as e:
     print(f"Warning: Model dependencies not available: {e}")
     print("Running in mock mode. Install torch and torchvision for actual inference.")
 
 # Check if model file exists
-MODEL_FILE_EXISTS = MODEL_AVAILABLE and os.path.exists(MODEL_PATH)
+MODEL_FILE_EXISTS = MODEL_AVAILABLE and os.path.exists(ONNX_PATH if USE_ORT else MODEL_PATH)
 
 # Concerns mapping based on difficulty
 DIFFICULTY_CONCERNS = {
@@ -50,35 +67,86 @@ DIFFICULTY_CONCERNS = {
 }
 
 
-def analyze_with_model(images: list) -> dict:
+# Images are resized to this size before inference
+MODEL_INPUT_SIZE = (224, 224)
+
+# Filename keywords identifying each view, checked in this order
+VIEW_KEYWORDS = {"front": "front", "open": "open", "lat": "lateral"}
+
+
+def _match_view(filename: str):
+    """Return the view a (lowercased) filename refers to, or None."""
+    # Exact names like front.png are a direct lookup on the stem
+    view = VIEW_KEYWORDS.get(filename.rsplit(".", 1)[0])
+    if view is None:
+        # Keyword priority, not position, decides: "relative_front.png" is front
+        view = next((v for k, v in VIEW_KEYWORDS.items() if k in filename), None)
+    return view
+
+
+# LRU cache of model predictions keyed by a hash of the uploaded image bytes
+PREDICTION_CACHE_SIZE = 256
+_prediction_cache = OrderedDict()
+_prediction_cache_lock = threading.Lock()
+
+
+def _images_key(*datas: bytes) -> bytes:
+    """Hash the raw bytes of the routed front, open and lateral uploads."""
+    h = hashlib.blake2b(digest_size=16)
+    for data in datas:
+        h.update(len(data).to_bytes(8, "little"))
+        h.update(data)
+    return h.digest()
+
+
+def _cached_prediction(key: bytes):
+    with _prediction_cache_lock:
+        result = _prediction_cache.get(key)
+        if result is not None:
+            _prediction_cache.move_to_end(key)
+        return result
+
+
+def _store_prediction(key: bytes, result: dict) -> None:
+    with _prediction_cache_lock:
+        _prediction_cache[key] = result
+        _prediction_cache.move_to_end(key)
+        while len(_prediction_cache) > PREDICTION_CACHE_SIZE:
+            _prediction_cache.popitem(last=False)
+
+
+def _predict_uploads(images: list, stack: ExitStack) -> dict:
     """
-    Analyze images using the ML model.
+    Open the uploads, route them to views and run (or reuse) a prediction.
 
-    The model expects exactly 3 images: front, open mouth, and lateral views.
-    Images are matched by filename: front.png, open.png, lat.png
-    If fewer images are provided, we duplicate/reuse images.
+    Every PIL image opened here has its close() registered on ``stack`` so
+    the caller frees the decoded pixels as soon as the prediction is done.
     """
     # Load images as PIL and match by filename
     image_dict = {}
-    for img_file in images:
-        img_file.seek(0)  # Reset file pointer
-        filename = img_file.filename.lower()
-        pil_img = Image.open(img_file)
+    raw_bytes = {}
+    opened = []
+    for filename, data in images:
+        filename = filename.lower()
+        pil_img = Image.open(io.BytesIO(data))
+        # Image.close() (not the context manager exit) frees the decoded pixels
+        stack.callback(pil_img.close)
+        # Phone photos often open as MPO, which subclasses JpegImageFile
+        if isinstance(pil_img, JpegImagePlugin.JpegImageFile):
+            # Let libjpeg decode at a reduced scale that still covers the model input
+            pil_img.draft("RGB", MODEL_INPUT_SIZE)
+        raw_bytes[id(pil_img)] = data
+        opened.append(pil_img)
 
         # Match filename to image type
-        if "front" in filename:
-            image_dict["front"] = pil_img
-        elif "open" in filename:
-            image_dict["open"] = pil_img
-        elif "lat" in filename:
-            image_dict["lateral"] = pil_img
-
-    # If we couldn't match by name, fall back to order
+        view = _match_view(filename)
+        if view is not None:
+            image_dict[view] = pil_img
+
+    # If we couldn't match by name, fall back to upload order,
+    # reusing the images already opened above
     if len(image_dict) < 3:
-        unmatched_images = []
-        for img_file in images:
-            img_file.seek(0)
-            unmatched_images.append(Image.open(img_file))
+        unmatched_images = opened
 
         # Fill missing slots
         if "front" not in image_dict:
@@ -100,12 +168,33 @@ def analyze_with_model(images: list) -> dict:
     if lateral_image is None:
         lateral_image = front_image
 
-    # Run model inference
-    result = predict_difficulty(
-        front_image=front_image,
-        open_image=open_image,
-        lateral_image=lateral_image
+    # Run model inference, reusing the prediction for repeated uploads
+    key = _images_key(
+        raw_bytes[id(front_image)],
+        raw_bytes[id(open_image)],
+        raw_bytes[id(lateral_image)],
     )
+    result = _cached_prediction(key)
+    if result is None:
+        result = predict_difficulty(
+            front_image=front_image,
+            open_image=open_image,
+            lateral_image=lateral_image
+        )
+        _store_prediction(key, result)
+    return result
+
+
+def analyze_with_model(images: list) -> dict:
+    """
+    Analyze images using the ML model.
+
+    The model expects exactly 3 images: front, open mouth, and lateral views.
+    Images are matched by filename: front.png, open.png, lat.png
+    If fewer images are provided, we duplicate/reuse images.
+    """
+    with ExitStack() as stack:
+        result = _predict_uploads(images, stack)
 
     # Convert probability to score (0-100)
     difficulty_prob = result["difficulty_probability"]
@@ -148,7 +237,12 @@ def analyze_mock(images: list) -> dict:
 
 
 def validate_images(request):
-    """Validate uploaded images and return valid ones or error response."""
+    """
+    Validate uploaded images and return valid ones or error response.
+
+    Valid images are returned as (filename, bytes) pairs, read from the
+    upload stream exactly once.
+    """
     if "images" not in request.files:
         return None, (jsonify({"error": "No images provided"}), 400)
 
@@ -172,7 +266,7 @@ def validate_images(request):
                 "error": f"Invalid file type: {img.filename}. Allowed types: JPEG, PNG, HEIC"
             }), 400)
 
-    return valid_images, None
+    return [(img.filename, img.stream.read()) for img in valid_images], None
 
 
 @app.route("/analyze", methods=["POST"])
@@ -243,11 +337,14 @@ def health():
     })
 
 
-# Preload model on startup if available
-if MODEL_AVAILABLE and MODEL_FILE_EXISTS:
+# The model is loaded lazily by the first /analyze request. Set INTUB_PRELOAD=1
+# to load and warm it up (including torch.compile) when the app is imported
+# instead. Under gunicorn without --preload, that happens in each worker after
+# the fork, so CUDA is never initialized in the master.
+if os.getenv("INTUB_PRELOAD", "0") == "1" and MODEL_AVAILABLE and MODEL_FILE_EXISTS:
     try:
         print("Preloading model...")
-        get_model()
+        preload_model()
         print("Model preloaded successfully")
     except Exception as e:
         print(f"Failed to preload model: {e}")
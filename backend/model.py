@@ -6,12 +6,17 @@ front, open mouth, and lateral views of the patient's airway.
 """
 
 import os
+import queue
+import threading
+import time
+import zipfile
 from typing import Optional
 
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 import torchvision
-from torchvision import transforms
+from torchvision.transforms import functional as TF
 from PIL import Image
 
 import warnings
@@ -19,18 +24,160 @@ warnings.filterwarnings('ignore')
 
 DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
 MODEL_PATH = os.path.join(os.path.dirname(__file__), "model.pt")
+ONNX_PATH = os.path.join(os.path.dirname(__file__), "model.onnx")
 LABELS = ["easy", "Difficult"]
+# ImageNet normalization used by the ConvNeXt-Tiny weights, shaped to broadcast over NCHW
+_base_tf = torchvision.models.ConvNeXt_Tiny_Weights.DEFAULT.transforms()
+MEAN = torch.tensor(_base_tf.mean).view(1, 3, 1, 1)
+STD = torch.tensor(_base_tf.std).view(1, 3, 1, 1)
+del _base_tf
+# Serve the exported model.onnx with ONNX Runtime instead of PyTorch
+# (see scripts/export_onnx.py)
+USE_ORT = os.getenv("INTUB_USE_ORT", "0") == "1"
+# Fold the three backbones into one shared backbone at load time
+# (smaller and faster, but not numerically identical to the trained model)
+SHARED_BACKBONE = os.getenv("INTUB_SHARED_BACKBONE", "0") == "1"
+# Compile the model with torch.compile on GPU (set INTUB_COMPILE=0 to run eagerly,
+# which lets the three backbones overlap on separate CUDA streams instead)
+COMPILE_MODEL = os.getenv("INTUB_COMPILE", "1") != "0"
+# Set INTUB_CPU_INT8=1 to quantize the frozen backbone stages to INT8 when
+# running on CPU. Off by default since it slightly changes the predictions
+QUANTIZE_CPU = os.getenv("INTUB_CPU_INT8", "0") == "1"
+# Backbone feature stages 0..FROZEN_STAGES-1 are frozen during training
+FROZEN_STAGES = 6
+# Page-locked memory for host->device uploads is bounded: at most
+# PINNED_STAGING_BUFFERS buffers of up to PINNED_STAGING_BYTES each
+PINNED_STAGING_BYTES = 32 * 1024 * 1024
+PINNED_STAGING_BUFFERS = 4
+# Concurrent requests are grouped into micro-batches of up to this size,
+# waiting at most MAX_BATCH_WAIT seconds for the batch to fill
+MAX_BATCH_SIZE = 8
+MAX_BATCH_WAIT = 0.01
+# A compiled model recompiles for every new input shape, so batches are padded
+# up to one of these sizes, all of which are compiled during warmup
+BATCH_BUCKETS = (1, 2, 4, MAX_BATCH_SIZE)
+PAD_BATCHES = DEVICE == "cuda" and COMPILE_MODEL and not USE_ORT
+# Which input each view receives in a micro-batch: with a shared backbone,
+# views filled in from another image are passed as the same tensor
+ALIAS_PATTERNS = ((0, 1, 2), (0, 0, 2), (0, 1, 0), (0, 1, 1), (0, 0, 0))
+# CUDA-graph trees (torch.compile "reduce-overhead") record a shape on its
+# second call and replay it from the third, so warmup runs each shape this often
+WARMUP_RUNS = 3
+
+
+class _PinnedStaging:
+    """Reusable pinned host buffer for asynchronous uint8 host->device copies."""
+
+    def __init__(self):
+        self.buffer = None
+        self.event = None
+
+    def upload(self, tensors: list) -> list:
+        # Wait until the previous copies out of this buffer have finished
+        if self.event is not None:
+            self.event.synchronize()
+        total = sum(t.numel() for t in tensors)
+        if self.buffer is None or self.buffer.numel() < total:
+            self.buffer = torch.empty(total, dtype=torch.uint8, pin_memory=True)
+
+        out = []
+        offset = 0
+        for t in tensors:
+            host = self.buffer[offset:offset + t.numel()].view(t.shape)
+            host.copy_(t)
+            out.append(host.to(DEVICE, non_blocking=True))
+            offset += t.numel()
+        self.event = torch.cuda.Event()
+        self.event.record()
+        return out
+
+
+# Idle staging buffers, created on demand up to PINNED_STAGING_BUFFERS
+_staging_pool = queue.SimpleQueue()
+_staging_count = 0
+_staging_lock = threading.Lock()
+
+
+def _acquire_staging():
+    """Take an idle staging buffer, or create one if the cap allows; else None."""
+    global _staging_count
+    try:
+        return _staging_pool.get_nowait()
+    except queue.Empty:
+        pass
+    with _staging_lock:
+        if _staging_count >= PINNED_STAGING_BUFFERS:
+            return None
+        _staging_count += 1
+    return _PinnedStaging()
+
+
+def _to_device(tensors: list) -> list:
+    """Move CPU uint8 tensors to DEVICE, via pinned memory on CUDA when it fits."""
+    if DEVICE != "cuda":
+        return [t.to(DEVICE) for t in tensors]
+    # Oversized uploads, or more concurrent uploads than buffers, take the
+    # ordinary pageable path rather than pinning more memory
+    staging = None
+    if sum(t.numel() for t in tensors) <= PINNED_STAGING_BYTES:
+        staging = _acquire_staging()
+    if staging is None:
+        return [t.to(DEVICE) for t in tensors]
+    try:
+        return staging.upload(tensors)
+    finally:
+        _staging_pool.put(staging)
 
 
 def get_eval_transform(size: int = 224):
-    """Get the evaluation transform (no augmentation)."""
-    base_tf = torchvision.models.ConvNeXt_Tiny_Weights.DEFAULT.transforms()
-    mean, std = base_tf.mean, base_tf.std
-    return transforms.Compose([
-        transforms.Resize((size, size)),
-        transforms.ToTensor(),
-        transforms.Normalize(mean=mean, std=std),
-    ])
+    """
+    Get the evaluation transform (no augmentation).
+
+    The returned callable maps a sequence of PIL images to a normalized
+    (N, 3, size, size) batch on DEVICE. On GPU, only decoding happens on the
+    CPU and resizing runs as a tensor op on the device; on CPU, images are
+    resized by PIL while still uint8.
+    """
+    # Fold the /255 scaling into the normalization constants; resizing is
+    # linear, so normalizing the resized 0..255 values gives the same result
+    shift = (MEAN * 255).to(DEVICE)
+    scale = (1 / (STD * 255)).to(DEVICE)
+
+    def transform(images) -> torch.Tensor:
+        decoded = []
+        for img in images:
+            rgb = img.convert("RGB")
+            if DEVICE != "cuda":
+                # Resizing full-resolution float tensors on the CPU would be slower
+                # and far larger than PIL's uint8 resize
+                resized = rgb.resize((size, size), Image.BILINEAR)
+                if rgb is not img:
+                    rgb.close()
+                rgb = resized
+            decoded.append(TF.pil_to_tensor(rgb))  # uint8 (3, H, W), copied out of PIL
+            # convert() returns a new image; release its pixel buffer right away
+            if rgb is not img:
+                rgb.close()
+            del rgb
+
+        if DEVICE == "cuda":
+            batch = [
+                F.interpolate(x.unsqueeze(0).float(), size=(size, size), mode="bilinear",
+                              align_corners=False, antialias=True)
+                for x in _to_device(decoded)
+            ]
+            x = torch.cat(batch)
+        else:
+            x = torch.stack(decoded).float()
+        x = x.sub_(shift).mul_(scale)
+        return x.contiguous(memory_format=torch.channels_last)
+
+    return transform
+
+
+# Per-thread scratch for the joint MLP input (see _joint_input). It is kept off
+# the module so forward never mutates module state and stays thread-safe
+_joint_scratch = threading.local()
 
 
 class TripleConvNeXtThreeBackbonesProj(nn.Module):
@@ -39,6 +186,8 @@ class TripleConvNeXtThreeBackbonesProj(nn.Module):
 
     Uses separate backbones for front, open mouth, and lateral views,
     each with its own projector, combined through a joint MLP classifier.
+    With shared_backbone=True a single backbone encodes all three views
+    (one forward call, a third of the weights); projectors stay per view.
     """
 
     def __init__(
@@ -50,24 +199,31 @@ class TripleConvNeXtThreeBackbonesProj(nn.Module):
         num_classes: int = 2,
         drop_p_proj: float = 0.5,
         drop_p_joint: float = 0.5,
-        use_bn: bool = True
+        use_bn: bool = True,
+        shared_backbone: bool = False
     ):
         super().__init__()
         weights = torchvision.models.ConvNeXt_Tiny_Weights.DEFAULT if pretrained else None
+        self.shared_backbone = shared_backbone
 
-        # 3 separate backbones
         front_net = torchvision.models.convnext_tiny(weights=weights)
         feat_dim = front_net.classifier[2].in_features  # 768 for convnext_tiny
         front_net.classifier = nn.Identity()
-        self.backbone_front = front_net
 
-        open_net = torchvision.models.convnext_tiny(weights=weights)
-        open_net.classifier = nn.Identity()
-        self.backbone_open = open_net
+        if shared_backbone:
+            # 1 backbone for all views
+            self.backbone = front_net
+        else:
+            # 3 separate backbones
+            self.backbone_front = front_net
+
+            open_net = torchvision.models.convnext_tiny(weights=weights)
+            open_net.classifier = nn.Identity()
+            self.backbone_open = open_net
 
-        lat_net = torchvision.models.convnext_tiny(weights=weights)
-        lat_net.classifier = nn.Identity()
-        self.backbone_lat = lat_net
+            lat_net = torchvision.models.convnext_tiny(weights=weights)
+            lat_net.classifier = nn.Identity()
+            self.backbone_lat = lat_net
 
         self.feat_dim = feat_dim
 
@@ -98,95 +254,459 @@ class TripleConvNeXtThreeBackbonesProj(nn.Module):
         self.classifier = nn.Linear(joint_out, num_classes)
 
         # Freezing/unfreezing
-        for p in self.backbone_front.parameters():
-            p.requires_grad = False
-        for p in self.backbone_open.parameters():
-            p.requires_grad = False
-        for p in self.backbone_lat.parameters():
-            p.requires_grad = False
-
-        # Unfreeze last two feature blocks
-        for p in self.backbone_front.features[6].parameters():
-            p.requires_grad = True
-        for p in self.backbone_front.features[7].parameters():
-            p.requires_grad = True
-        for p in self.backbone_open.features[6].parameters():
-            p.requires_grad = True
-        for p in self.backbone_open.features[7].parameters():
-            p.requires_grad = True
-        for p in self.backbone_lat.features[6].parameters():
-            p.requires_grad = True
-        for p in self.backbone_lat.features[7].parameters():
-            p.requires_grad = True
+        for name in self.backbone_names():
+            backbone = getattr(self, name)
+            for p in backbone.parameters():
+                p.requires_grad = False
+
+            # Unfreeze last two feature blocks
+            for p in backbone.features[6].parameters():
+                p.requires_grad = True
+            for p in backbone.features[7].parameters():
+                p.requires_grad = True
+
+    def backbone_names(self) -> tuple:
+        """Attribute names of the backbone modules."""
+        if getattr(self, "shared_backbone", False):
+            return ("backbone",)
+        return ("backbone_front", "backbone_open", "backbone_lat")
+
+    def _joint_input(self, pF, pO, pL):
+        """Concatenate the projections, reusing a scratch buffer in eager inference."""
+        # Training needs a fresh tensor for autograd, and a scratch allocated in
+        # inference mode can't be written outside it; export and torch.compile
+        # see a plain cat, which Inductor fuses anyway
+        if (
+            not torch.is_inference_mode_enabled()
+            or torch.onnx.is_in_onnx_export()
+            or torch.compiler.is_compiling()
+        ):
+            return torch.cat([pF, pO, pL], dim=1)
+
+        B, D = pF.shape
+        buf = getattr(_joint_scratch, "buf", None)
+        if (
+            buf is None
+            or buf.shape[0] < B
+            or buf.shape[1] != 3 * D
+            or buf.dtype != pF.dtype
+            or buf.device != pF.device
+        ):
+            buf = torch.empty(B, 3 * D, dtype=pF.dtype, device=pF.device)
+            _joint_scratch.buf = buf
+        joint = buf[:B]
+        joint[:, :D].copy_(pF)
+        joint[:, D:2 * D].copy_(pO)
+        joint[:, 2 * D:].copy_(pL)
+        return joint
+
+    def _encode_on_streams(self, views):
+        """Run each (backbone, input) view on its own CUDA stream."""
+        # Streams are created lazily so the model can still be built without CUDA
+        streams = getattr(self, "_streams", None)
+        if streams is None:
+            streams = [torch.cuda.Stream(device=views[0][1].device) for _ in views]
+            self._streams = streams
+
+        main = torch.cuda.current_stream()
+        outs = []
+        for stream, (backbone, x) in zip(streams, views):
+            stream.wait_stream(main)
+            with torch.cuda.stream(stream):
+                x.record_stream(stream)
+                outs.append(backbone(x).flatten(1))
+        for stream, out in zip(streams, outs):
+            main.wait_stream(stream)
+            out.record_stream(main)
+        return outs
+
+    def _encode_shared(self, front, open_, lat):
+        """Run the distinct view inputs through the shared backbone in one call."""
+        inputs = (front, open_, lat)
+        # Views filled in by reusing another image share the same tensor
+        unique = []
+        for x in inputs:
+            if not any(x is u for u in unique):
+                unique.append(x)
+        feats = self.backbone(torch.cat(unique) if len(unique) > 1 else unique[0]).flatten(1)
+        feats = feats.split(front.shape[0])
+        return tuple(feats[next(i for i, u in enumerate(unique) if u is x)] for x in inputs)
 
     def forward(self, front, open_, lat, features_only: bool = False):
-        fF = self.backbone_front(front).flatten(1)
-        fO = self.backbone_open(open_).flatten(1)
-        fL = self.backbone_lat(lat).flatten(1)
-
-        pF = self.proj_front(fF)
-        pO = self.proj_open(fO)
-        pL = self.proj_lat(fL)
-
-        cat = torch.cat([pF, pO, pL], dim=1)
-        z = self.joint_mlp(cat)
+        if getattr(self, "shared_backbone", False):
+            fF, fO, fL = self._encode_shared(front, open_, lat)
+            return self._head(fF, fO, fL, features_only)
+
+        views = (
+            (self.backbone_front, front),
+            (self.backbone_open, open_),
+            (self.backbone_lat, lat),
+        )
+        # The backbones are independent, so in eager mode on GPU they can
+        # overlap; under torch.compile the graph is captured sequentially
+        if front.is_cuda and not torch.compiler.is_compiling():
+            fF, fO, fL = self._encode_on_streams(views)
+        else:
+            fF, fO, fL = (backbone(x).flatten(1) for backbone, x in views)
+        return self._head(fF, fO, fL, features_only)
+
+    def _head(self, fF, fO, fL, features_only: bool):
+        """Project the backbone features and classify them through the joint MLP."""
+        # BatchNorm1d is not on autocast's FP32 list, so run the small head with
+        # autocast disabled to keep the projector and joint MLP norms in FP32
+        with torch.autocast(device_type=fF.device.type, enabled=False):
+            pF = self.proj_front(fF.float())
+            pO = self.proj_open(fO.float())
+            pL = self.proj_lat(fL.float())
+            z = self.joint_mlp(self._joint_input(pF, pO, pL))
+
+            if features_only:
+                return z
+
+            out = self.classifier(z)
+        return out
 
-        if features_only:
-            return z
 
-        out = self.classifier(z)
-        return out
+def fold_backbones(state_dict: dict, view: str = "front") -> dict:
+    """
+    Adapt a three-backbone state dict for a shared-backbone model.
 
+    Keeps the weights of the backbone trained on `view` as the shared
+    backbone and drops the other two.
+    """
+    prefix = f"backbone_{view}."
+    folded = {}
+    for key, value in state_dict.items():
+        if key.startswith(prefix):
+            folded["backbone." + key[len(prefix):]] = value
+        elif not key.startswith("backbone_"):
+            folded[key] = value
+    return folded
+
+
+def _config_from_module(model: nn.Module) -> dict:
+    """Recover the constructor arguments of a pickled TripleConvNeXtThreeBackbonesProj."""
+    proj = list(model.proj_front)
+    joint = list(model.joint_mlp)
+    return {
+        "proj_dim": proj[0].out_features,
+        "joint_hidden": joint[0].out_features,
+        "joint_out": model.classifier.in_features,
+        "num_classes": model.classifier.out_features,
+        "drop_p_proj": next(m.p for m in proj if isinstance(m, nn.Dropout)),
+        "drop_p_joint": next(m.p for m in joint if isinstance(m, nn.Dropout)),
+        "use_bn": any(isinstance(m, nn.BatchNorm1d) for m in proj),
+        "shared_backbone": getattr(model, "shared_backbone", False),
+    }
+
+
+def load_model(
+    model_path: str,
+    device: Optional[str] = None,
+    shared_backbone: bool = False,
+) -> nn.Module:
+    """
+    Load the model from a checkpoint file.
 
-def load_model(model_path: str, device: Optional[str] = None) -> nn.Module:
-    """Load the model from a checkpoint file."""
+    With shared_backbone=True, a three-backbone checkpoint is folded into a
+    single shared backbone (see fold_backbones). Predictions then differ
+    from the original model for the open and lateral views.
+    """
     if device is None:
         device = "cuda" if torch.cuda.is_available() else "cpu"
 
-    ckpt = torch.load(model_path, map_location=device, weights_only=False)
+    # mmap lets forked CPU workers share the checkpoint's pages instead of each
+    # reading its own copy into memory (only supported for zip checkpoints).
+    # The model below adopts these tensors rather than copying them
+    mmap = zipfile.is_zipfile(model_path)
+    ckpt = torch.load(model_path, map_location=device, weights_only=False, mmap=mmap)
 
-    if isinstance(ckpt, nn.Module):
+    if isinstance(ckpt, nn.Module) and not shared_backbone:
         model = ckpt.to(device)
         model.eval()
         return model
 
-    if isinstance(ckpt, dict) and "state_dict" in ckpt:
-        config = ckpt.get("config", {})
+    if isinstance(ckpt, nn.Module):
+        # The weights come from the checkpoint, so skip the ImageNet download
+        config = {**_config_from_module(ckpt), "pretrained": False}
+        state_dict = ckpt.state_dict()
+    elif isinstance(ckpt, dict) and "state_dict" in ckpt:
+        config, state_dict = ckpt.get("config", {}), ckpt["state_dict"]
+    elif isinstance(ckpt, dict):
+        config, state_dict = {}, ckpt
+    else:
+        raise ValueError("Unrecognized checkpoint format.")
+
+    if shared_backbone and not config.get("shared_backbone", False):
+        config = {**config, "shared_backbone": True}
+        state_dict = fold_backbones(state_dict)
+
+    # assign=True keeps the (mmap'd) checkpoint tensors as the parameters
+    model = TripleConvNeXtThreeBackbonesProj(**{**config, "pretrained": False}).to(device)
+    missing, _ = model.load_state_dict(state_dict, strict=False, assign=True)
+    if missing and config.get("pretrained", True):
+        # Partial checkpoint: fill the missing weights from ImageNet as before
         model = TripleConvNeXtThreeBackbonesProj(**config).to(device)
-        model.load_state_dict(ckpt["state_dict"], strict=False)
-        model.eval()
-        return model
+        model.load_state_dict(state_dict, strict=False)
+    model.eval()
+    return model
 
-    if isinstance(ckpt, dict):
-        model = TripleConvNeXtThreeBackbonesProj().to(device)
-        model.load_state_dict(ckpt, strict=False)
-        model.eval()
-        return model
 
-    raise ValueError("Unrecognized checkpoint format.")
+class OrtModel:
+    """Run the exported ONNX graph with ONNX Runtime behind the model's call signature."""
+
+    def __init__(self, model_path: str):
+        import onnxruntime as ort
+
+        available = ort.get_available_providers()
+        providers = [p for p in ("CUDAExecutionProvider", "CPUExecutionProvider") if p in available]
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=providers)
+
+    def __call__(self, front, open_, lat):
+        feeds = {
+            name: x.float().contiguous().cpu().numpy()
+            for name, x in (("front", front), ("open", open_), ("lat", lat))
+        }
+        (logits,) = self.session.run(["logits"], feeds)
+        return torch.from_numpy(logits)
+
+
+def quantize_frozen_backbones(model: nn.Module) -> nn.Module:
+    """
+    Dynamically quantize the Linear layers of the frozen backbone stages to INT8.
+
+    ConvNeXt's pointwise convolutions are nn.Linear layers, so these carry
+    most of the backbone FLOPs. The trainable last stages, projectors,
+    joint MLP and classifier are left in FP32.
+    """
+    names = set()
+    for backbone_name in model.backbone_names():
+        features = getattr(model, backbone_name).features
+        for stage in range(FROZEN_STAGES):
+            for sub_name, module in features[stage].named_modules():
+                if isinstance(module, nn.Linear):
+                    names.add(f"{backbone_name}.features.{stage}.{sub_name}")
+    return torch.ao.quantization.quantize_dynamic(model, names, dtype=torch.qint8, inplace=True)
 
 
 # Global model instance (lazy loaded)
 _model = None
 _transform = None
+# Mixed-precision dtype for GPU inference, chosen once the model is loaded
+_amp_dtype = torch.float16
+_model_lock = threading.Lock()
+
+# Pinned host buffer for device->host copies of the output probabilities
+_host_buffer = None
+_host_lock = threading.Lock()
+
+
+def _to_host_list(t: torch.Tensor) -> list:
+    """Copy a small device tensor to the host with a single synchronization."""
+    global _host_buffer
+    if not t.is_cuda:
+        return t.tolist()
+    with _host_lock:
+        if _host_buffer is None or _host_buffer.numel() < t.numel():
+            _host_buffer = torch.empty(t.numel(), dtype=t.dtype, pin_memory=True)
+        out = _host_buffer[:t.numel()]
+        out.copy_(t.flatten(), non_blocking=True)
+        torch.cuda.current_stream().synchronize()
+        return out.view(t.shape).tolist()
+
+
+def _optimize_for_device(model: nn.Module) -> nn.Module:
+    """Apply the device-specific inference optimizations to a loaded model."""
+    if DEVICE == "cuda":
+        # ConvNeXt's depthwise convs run faster in NHWC on tensor cores
+        model = model.to(memory_format=torch.channels_last)
+        if COMPILE_MODEL:
+            # Fuse LayerNorm/GELU/conv epilogues and drop per-op dispatch
+            model = torch.compile(model, mode="reduce-overhead", fullgraph=False)
+    elif QUANTIZE_CPU:
+        model = quantize_frozen_backbones(model)
+    return model
+
+
+def _autocast():
+    """Autocast context for the backbones; mixed precision is only used on GPU."""
+    return torch.autocast(device_type=DEVICE, dtype=_amp_dtype, enabled=DEVICE == "cuda")
+
+
+@torch.inference_mode()
+def _warmup(model, size: int = 224) -> None:
+    """
+    Run dummy forward passes so the first requests don't pay compile cost.
+
+    Every batch size and input-aliasing pattern the batch worker can send is
+    run WARMUP_RUNS times, since each new one would otherwise be compiled and
+    captured while serving. CUDA-graph trees are kept per thread, so this must
+    run on the batch worker thread itself (see _inference_worker).
+    """
+    sizes = BATCH_BUCKETS if PAD_BATCHES else (1,)
+    patterns = ALIAS_PATTERNS if getattr(model, "shared_backbone", False) else ALIAS_PATTERNS[:1]
+    for batch_size in sizes:
+        for pattern in patterns:
+            xs = [
+                torch.zeros(batch_size, 3, size, size, device=DEVICE).to(memory_format=torch.channels_last)
+                for _ in range(3)
+            ]
+            for _ in range(WARMUP_RUNS):
+                with _autocast():
+                    model(*(xs[i] for i in pattern))
 
 
 def get_model():
-    """Get or load the model singleton."""
-    global _model, _transform
+    """
+    Get or load the model singleton.
+
+    The model is loaded on first use rather than at import, so each server
+    worker only pays the load cost once it actually serves a request.
+    """
+    global _model, _transform, _amp_dtype
     if _model is None:
-        if not os.path.exists(MODEL_PATH):
-            raise FileNotFoundError(
-                f"Model file not found at {MODEL_PATH}. "
-                "Please place the trained model.pt file in the backend directory."
-            )
-        print(f"Loading model from {MODEL_PATH}...")
-        _model = load_model(MODEL_PATH, device=DEVICE)
-        _transform = get_eval_transform()
-        print(f"Model loaded successfully on {DEVICE}")
+        with _model_lock:
+            if _model is None:
+                model_path = ONNX_PATH if USE_ORT else MODEL_PATH
+                if not os.path.exists(model_path):
+                    raise FileNotFoundError(
+                        f"Model file not found at {model_path}. "
+                        f"Please place the trained {os.path.basename(model_path)} file in the backend directory."
+                    )
+                print(f"Loading model from {model_path}...")
+                # Probing the device initializes CUDA, so it happens here rather
+                # than at import (forked workers must not inherit a CUDA context)
+                if DEVICE == "cuda" and torch.cuda.is_bf16_supported():
+                    _amp_dtype = torch.bfloat16
+                if USE_ORT:
+                    model = OrtModel(model_path)
+                else:
+                    model = load_model(model_path, device=DEVICE, shared_backbone=SHARED_BACKBONE)
+                    model = _optimize_for_device(model)
+                _transform = get_eval_transform()
+                # Publish the model last so other threads never see it half-initialized
+                _model = model
+                print(f"Model loaded successfully on {DEVICE}")
     return _model, _transform
 
 
+class _InferenceRequest:
+    """A preprocessed view triple waiting for the batch worker."""
+
+    def __init__(self, front: torch.Tensor, open_: torch.Tensor, lat: torch.Tensor):
+        self.front = front
+        self.open = open_
+        self.lat = lat
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_inference_queue = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+# Set once the batch worker has finished warming up the model
+_worker_ready = threading.Event()
+
+
+def _drain_batch(q: queue.Queue, max_batch: int, max_wait: float) -> list:
+    """Block for one request, then collect more until the batch is full or max_wait passes."""
+    batch = [q.get()]
+    deadline = time.monotonic() + max_wait
+    while len(batch) < max_batch:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(q.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+
+def _padded_size(n: int) -> int:
+    """Batch size to run n requests at (see BATCH_BUCKETS)."""
+    if not PAD_BATCHES:
+        return n
+    return next(size for size in BATCH_BUCKETS if size >= n)
+
+
+def _view_batch(batch: list, view: str, size: int) -> torch.Tensor:
+    """Concatenate one view across the batch, padding by repeating the last request."""
+    rows = [getattr(r, view) for r in batch]
+    rows += rows[-1:] * (size - len(rows))
+    return torch.cat(rows)
+
+
+@torch.inference_mode()
+def _run_batch(model: nn.Module, batch: list) -> list:
+    """Run one forward pass over a micro-batch and return P(difficult) per request."""
+    size = _padded_size(len(batch))
+    # Only a shared backbone can reuse features for aliased views; separate
+    # backbones always get distinct tensors so the compiled graph stays the same
+    shared = getattr(model, "shared_backbone", False)
+
+    front = _view_batch(batch, "front", size)
+    if shared and all(r.open is r.front for r in batch):
+        open_ = front
+    else:
+        open_ = _view_batch(batch, "open", size)
+    if shared and all(r.lat is r.front for r in batch):
+        lat = front
+    elif shared and all(r.lat is r.open for r in batch):
+        lat = open_
+    else:
+        lat = _view_batch(batch, "lat", size)
+
+    with _autocast():
+        logits = model(front, open_, lat)[:len(batch)].float()
+    # For two classes, softmax(logits)[:, 1] == sigmoid(logit_1 - logit_0)
+    return _to_host_list(torch.sigmoid(logits[:, 1] - logits[:, 0]))
+
+
+def _inference_worker() -> None:
+    """Serve queued requests in micro-batches for the lifetime of the process."""
+    model, _ = get_model()
+    # Warm up here rather than in get_model: compiled CUDA graphs are per
+    # thread, so graphs recorded on any other thread would never be replayed
+    try:
+        _warmup(model)
+    except Exception as e:
+        print(f"Model warmup failed: {e}")
+    finally:
+        _worker_ready.set()
+
+    while True:
+        batch = _drain_batch(_inference_queue, MAX_BATCH_SIZE, MAX_BATCH_WAIT)
+        try:
+            for request, prob in zip(batch, _run_batch(model, batch)):
+                request.result = prob
+        except Exception as e:
+            for request in batch:
+                request.error = e
+        finally:
+            for request in batch:
+                request.event.set()
+
+
+def _ensure_worker() -> None:
+    """Start the batch worker thread if it isn't running yet."""
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_inference_worker, name="inference-worker", daemon=True)
+            _worker.start()
+
+
+def preload_model() -> None:
+    """Load the model and block until the batch worker has warmed it up."""
+    get_model()
+    _ensure_worker()
+    _worker_ready.wait()
+
+
 @torch.inference_mode()
 def predict_difficulty(
     front_image: Image.Image,
@@ -204,18 +724,26 @@ def predict_difficulty(
     Returns:
         dict with difficulty_probability (0-1) and prediction label
     """
-    model, transform = get_model()
-
-    # Convert to RGB if needed and apply transforms
-    x_front = transform(front_image.convert("RGB")).unsqueeze(0).to(DEVICE)
-    x_open = transform(open_image.convert("RGB")).unsqueeze(0).to(DEVICE)
-    x_lat = transform(lateral_image.convert("RGB")).unsqueeze(0).to(DEVICE)
-
-    # Run inference
-    logits = model(x_front, x_open, x_lat)
-    probs = torch.softmax(logits, dim=1)
-    difficult_prob = probs[0, 1].item()
-    print(f"Difficult probability: {difficult_prob}")
+    _, transform = get_model()
+    _ensure_worker()
+    # Requests wait for warmup instead of triggering compiles on the worker
+    _worker_ready.wait()
+
+    # Resize and normalize the distinct views on the device as one batch. When a
+    # view was filled in by reusing another image, it shares that image's tensor
+    views = (front_image, open_image, lateral_image)
+    unique = list({id(img): img for img in views}.values())
+    rows = dict(zip(map(id, unique), transform(unique).unsqueeze(1)))
+    x_front, x_open, x_lat = (rows[id(img)] for img in views)
+
+    # Hand off to the batch worker, which may group us with concurrent requests
+    request = _InferenceRequest(x_front, x_open, x_lat)
+    _inference_queue.put(request)
+    request.event.wait()
+    if request.error is not None:
+        raise request.error
+
+    difficult_prob = request.result
     return {
         "difficulty_probability": float(difficult_prob),
         "prediction": "Difficult" if difficult_prob > 0.5 else "Easy"
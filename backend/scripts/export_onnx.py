@@ -0,0 +1,43 @@
+"""
+Export the trained model to ONNX for serving with ONNX Runtime.
+
+Usage (from the backend directory):
+    uv run --extra onnx scripts/export_onnx.py [output_path]
+
+The exported graph takes `front`, `open` and `lat` inputs of shape
+(batch, 3, 224, 224) and returns `logits` of shape (batch, 2). Set
+INTUB_USE_ORT=1 to have the API serve it instead of model.pt.
+"""
+
+import os
+import sys
+
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model import MODEL_PATH, ONNX_PATH, SHARED_BACKBONE, load_model  # noqa: E402
+
+
+def main() -> None:
+    output_path = sys.argv[1] if len(sys.argv) > 1 else ONNX_PATH
+
+    print(f"Loading model from {MODEL_PATH}...")
+    model = load_model(MODEL_PATH, device="cpu", shared_backbone=SHARED_BACKBONE)
+
+    dummy = torch.randn(1, 3, 224, 224)
+    batch_axis = {0: "batch"}
+    torch.onnx.export(
+        model,
+        (dummy, dummy.clone(), dummy.clone()),
+        output_path,
+        input_names=["front", "open", "lat"],
+        output_names=["logits"],
+        dynamic_axes={"front": batch_axis, "open": batch_axis, "lat": batch_axis, "logits": batch_axis},
+        opset_version=17,
+    )
+    print(f"Exported ONNX model to {output_path}")
+
+
+if __name__ == "__main__":
+    main()